@@ -77,11 +77,17 @@ def get_sensor_report(modules: list = None) -> dict:
     Returns:
         Dict with requested sensor data, raw and synthesized, ready for agent interpretation.
     """
+    return build_sensor_report(run_pipeline(), modules)
+
+
+def build_sensor_report(data: dict, modules: list = None) -> dict:
+    """
+    Builds the module report from an already computed pipeline summary.
+    Lets the HTTP API serve the same report from its cached pipeline result.
+    """
     if modules is None:
         modules = list(MODULE_MAP.keys())
 
-    data = run_pipeline()
-
     if data["status"] == "error":
         return data
 
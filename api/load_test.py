@@ -0,0 +1,69 @@
+import time
+import asyncio
+import argparse
+from collections import Counter
+
+import aiohttp
+
+
+async def client_loop(session, url, deadline, revalidate, latencies, statuses):
+    """
+    Polls url until deadline. With revalidate, replays the last ETag as If-None-Match
+    like a well-behaved dashboard would.
+    """
+    etag = None
+    while time.monotonic() < deadline:
+        headers = {"Accept-Encoding": "gzip"}
+        if revalidate and etag:
+            headers["If-None-Match"] = etag
+
+        start = time.monotonic()
+        try:
+            async with session.get(url, headers=headers) as response:
+                await response.read()
+                etag = response.headers.get("ETag", etag)
+                statuses[response.status] += 1
+        except aiohttp.ClientError as e:
+            statuses[type(e).__name__] += 1
+        latencies.append((time.monotonic() - start) * 1000)
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+async def run(url: str, clients: int, duration: float, revalidate: bool) -> None:
+    latencies = []
+    statuses = Counter()
+    deadline = time.monotonic() + duration
+
+    connector = aiohttp.TCPConnector(limit=clients)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*[
+            client_loop(session, url, deadline, revalidate, latencies, statuses)
+            for _ in range(clients)
+        ])
+
+    total = len(latencies)
+    print(f"[load_test] {url} - {clients} clients for {duration}s")
+    print(f"[load_test] Requests: {total} ({total / duration:.1f} req/s)")
+    print(f"[load_test] Status: {dict(statuses)}")
+    print(
+        f"[load_test] Latency ms - p50: {percentile(latencies, 50):.2f} "
+        f"p95: {percentile(latencies, 95):.2f} p99: {percentile(latencies, 99):.2f} "
+        f"max: {max(latencies, default=0):.2f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent polling load test for the query API.")
+    parser.add_argument("--url", default="http://localhost:8080/report")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--no-revalidate", action="store_true", help="Do not send If-None-Match")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.url, args.clients, args.duration, not args.no_revalidate))
@@ -0,0 +1,349 @@
+import os
+import sys
+import json
+import gzip
+import math
+import time
+import asyncio
+import hashlib
+from datetime import datetime, timezone
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+load_dotenv('/home/ghost/air-agent/.env')
+
+sys.path.append('/home/ghost/air-agent/ingestor')
+sys.path.append('/home/ghost/air-agent/processor')
+sys.path.append('/home/ghost/air-agent/agent')
+sys.path.append('/home/ghost/air-agent/db')
+
+from aggregator import run_pipeline
+from metrics import SENSORS
+from tools import build_sensor_report, MODULE_MAP
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8080"))
+
+PIPELINE_TTL = int(os.getenv("API_PIPELINE_TTL", "240"))  # ~one sample interval (15 samples/hour)
+HISTORY_TTL = int(os.getenv("API_HISTORY_TTL", "60"))
+COMPUTE_TIMEOUT = int(os.getenv("API_COMPUTE_TIMEOUT", "30"))
+ERROR_TTL = 15  # keeps upstream protected while it is down, without hiding recovery for long
+STALE_GRACE = PIPELINE_TTL  # expired entries are kept this long to be served while a refresh runs
+
+DAYS_OF_WEEK = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+BASELINE_SENSORS = ["pm25", "pm10"]
+
+# key -> (expires_at, value); key -> asyncio.Task for computations in flight
+_cache = {}
+_inflight = {}
+
+
+def _json_safe(value):
+    """Replaces NaN/inf (e.g. variance of a single sample) with None, recursively."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    return value
+
+
+class Payload:
+    """
+    Encoded response body, ready to serve as-is or gzipped, with one strong ETag per encoding.
+    expires_at is when the underlying data stops being fresh (drives Cache-Control max-age).
+    """
+
+    def __init__(self, data: dict, expires_at: float, status: int = 200):
+        self.status = status
+        self.expires_at = expires_at
+        self.body = json.dumps(_json_safe(data), default=str, allow_nan=False).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body)
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gz"'
+
+
+def _error_payload(message: str) -> tuple:
+    expires_at = time.monotonic() + ERROR_TTL
+    return expires_at, Payload({"status": "error", "message": message}, expires_at, status=503)
+
+
+def _evict_expired() -> None:
+    now = time.monotonic()
+    for key in [k for k, (expires_at, _) in _cache.items() if expires_at + STALE_GRACE <= now]:
+        if key not in _inflight:
+            del _cache[key]
+
+
+async def _memoized(key, compute):
+    """
+    Returns the cached (expires_at, value) entry for key, computing it at most once per expiry.
+    Concurrent callers share a single in-flight computation; while a refresh is running,
+    callers that have a stale entry get it instead of waiting.
+    compute() must return an (expires_at, value) tuple and must not raise.
+    """
+    entry = _cache.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry
+
+    task = _inflight.get(key)
+    if task is not None and entry:
+        return entry
+
+    if task is None:
+        async def runner():
+            try:
+                result = await compute()
+                _cache[key] = result
+                _evict_expired()
+                return result
+            finally:
+                _inflight.pop(key, None)
+
+        task = asyncio.ensure_future(runner())
+        _inflight[key] = task
+
+    # shield: a client disconnecting must not cancel the work other clients are waiting on
+    return await asyncio.shield(task)
+
+
+async def _in_executor(fn, *args):
+    """Runs a blocking call (HTTP, database) off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+
+async def get_pipeline() -> tuple:
+    """
+    Cached run_pipeline() result as (expires_at, data). This is the only path that reaches
+    the Colmena API, so upstream load is bounded by PIPELINE_TTL regardless of how many
+    clients poll. Failures and timeouts are cached too, for ERROR_TTL.
+    """
+    async def compute():
+        try:
+            data = await asyncio.wait_for(_in_executor(run_pipeline), COMPUTE_TIMEOUT)
+        except Exception as e:
+            print(f"[api] Pipeline failed: {type(e).__name__}: {e}")
+            data = {
+                "status": "error",
+                "message": "Pipeline failed",
+                "timestamp": datetime.now(timezone.utc).isoformat()
+            }
+        ttl = ERROR_TTL if data["status"] == "error" else PIPELINE_TTL
+        return time.monotonic() + ttl, data
+
+    return await _memoized("pipeline", compute)
+
+
+async def _serve(request: web.Request, key, build) -> web.Response:
+    """
+    Serves a cached Payload with ETag / If-None-Match revalidation and gzip when accepted.
+    build() returns (cache_until, Payload) and bounds its own blocking calls with
+    COMPUTE_TIMEOUT; any failure is cached as a 503 for ERROR_TTL.
+    """
+    async def compute():
+        try:
+            return await build()
+        except Exception as e:
+            print(f"[api] Error building {key}: {type(e).__name__}: {e}")
+            return _error_payload("Upstream unavailable")
+
+    _, payload = await _memoized(key, compute)
+
+    use_gzip = _accepts_gzip(request.headers.get("Accept-Encoding", ""))
+    etag = payload.gzip_etag if use_gzip else payload.etag
+    max_age = max(int(payload.expires_at - time.monotonic()), 0)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}",
+        "Vary": "Accept-Encoding",
+    }
+
+    if payload.status == 200 and _etag_matches(request.headers.get("If-None-Match"), etag):
+        return web.Response(status=304, headers=headers)
+
+    body = payload.body
+    if use_gzip:
+        body = payload.gzip_body
+        headers["Content-Encoding"] = "gzip"
+
+    return web.Response(body=body, status=payload.status, content_type="application/json", headers=headers)
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Parses Accept-Encoding q-values; gzip (or *) must be listed with q > 0."""
+    qvalues = {}
+    for item in accept_encoding.split(","):
+        parts = [p.strip() for p in item.split(";")]
+        coding = parts[0].lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            if param.lower().startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        qvalues[coding] = q
+
+    if "gzip" in qvalues:
+        return qvalues["gzip"] > 0
+    return qvalues.get("*", 0) > 0
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _bad_request(message: str) -> web.Response:
+    return web.json_response({"status": "error", "message": message}, status=400)
+
+
+def _parse_list(request: web.Request, name: str, default: list) -> list:
+    raw = request.query.get(name)
+    return sorted(set(v.strip() for v in raw.split(",") if v.strip())) if raw else list(default)
+
+
+def _parse_hour_and_day(request: web.Request):
+    """
+    Reads hour and day_of_week from the query string, defaulting to the current UTC hour/day
+    (same convention save_relevant_event uses when storing events).
+    """
+    now = datetime.now(timezone.utc)
+    day_of_week = request.query.get("day_of_week", now.strftime("%A"))
+    try:
+        hour = int(request.query.get("hour", now.hour))
+    except ValueError:
+        raise ValueError("hour must be an integer (0-23)")
+
+    if not 0 <= hour <= 23:
+        raise ValueError("hour must be between 0 and 23")
+    if day_of_week not in DAYS_OF_WEEK:
+        raise ValueError("day_of_week must be one of: " + ", ".join(DAYS_OF_WEEK))
+
+    return hour, day_of_week
+
+
+async def _serve_report(request: web.Request, modules: list) -> web.Response:
+    """
+    Report built with build_sensor_report from the cached pipeline. The payload is keyed on
+    the pipeline run it was built from (its expires_at) and shares that expiry, so every
+    endpoint serves the same run, and a stale run served during a refresh is encoded once.
+    """
+    expires_at, data = await get_pipeline()
+
+    async def build():
+        report = build_sensor_report(data, modules)
+        payload = Payload(report, expires_at, status=503 if report["status"] == "error" else 200)
+        # valid for as long as this run can be served, stale included
+        return expires_at + STALE_GRACE, payload
+
+    return await _serve(request, ("report", tuple(modules), expires_at), build)
+
+
+async def handle_report(request: web.Request) -> web.Response:
+    """
+    GET /report?modules=particle,environmental
+    Same output as the get_sensor_report tool, with modules always listed in MODULE_MAP order
+    so any spelling of the same module set shares one cached payload.
+    """
+    requested = _parse_list(request, "modules", MODULE_MAP)
+    unknown = [m for m in requested if m not in MODULE_MAP]
+    if unknown:
+        return _bad_request("Unknown modules: " + ", ".join(unknown) + ". Options: " + ", ".join(MODULE_MAP))
+
+    return await _serve_report(request, [m for m in MODULE_MAP if m in requested])
+
+
+async def handle_device(request: web.Request) -> web.Response:
+    """
+    GET /device
+    Device health snapshot (battery, failure code, internal temp); same as /report?modules=device.
+    """
+    return await _serve_report(request, ["device"])
+
+
+async def handle_events(request: web.Request) -> web.Response:
+    """
+    GET /events?hour=8&day_of_week=Monday
+    Historical relevant events stored for the same hour and day of week.
+    """
+    try:
+        hour, day_of_week = _parse_hour_and_day(request)
+    except ValueError as e:
+        return _bad_request(str(e))
+
+    async def build():
+        from database import get_similar_events
+        events = await asyncio.wait_for(
+            _in_executor(lambda: get_similar_events(hour=hour, day_of_week=day_of_week)),
+            COMPUTE_TIMEOUT
+        )
+        expires_at = time.monotonic() + HISTORY_TTL
+        return expires_at, Payload({
+            "status": "ok",
+            "hour": hour,
+            "day_of_week": day_of_week,
+            "events_found": len(events),
+            "similar_events": events
+        }, expires_at)
+
+    return await _serve(request, ("events", hour, day_of_week), build)
+
+
+async def handle_baselines(request: web.Request) -> web.Response:
+    """
+    GET /baselines?hour=8&day_of_week=Monday&sensors=pm25,pm10
+    Stored baselines per sensor for the given hour and day of week.
+    """
+    try:
+        hour, day_of_week = _parse_hour_and_day(request)
+    except ValueError as e:
+        return _bad_request(str(e))
+
+    sensors = _parse_list(request, "sensors", BASELINE_SENSORS)
+    unknown = [s for s in sensors if s not in SENSORS]
+    if unknown:
+        return _bad_request("Unknown sensors: " + ", ".join(unknown) + ". Options: " + ", ".join(SENSORS))
+
+    async def build():
+        from database import get_baseline
+
+        def fetch():
+            baselines = {}
+            for sensor in sensors:
+                baseline = get_baseline(day_of_week=day_of_week, hour=hour, sensor_id=sensor)
+                if baseline:
+                    baselines[sensor] = baseline
+            return baselines
+
+        baselines = await asyncio.wait_for(_in_executor(fetch), COMPUTE_TIMEOUT)
+        expires_at = time.monotonic() + HISTORY_TTL
+        return expires_at, Payload({
+            "status": "ok",
+            "hour": hour,
+            "day_of_week": day_of_week,
+            "baselines": baselines
+        }, expires_at)
+
+    return await _serve(request, ("baselines", hour, day_of_week, tuple(sensors)), build)
+
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app.router.add_get("/report", handle_report)
+    app.router.add_get("/device", handle_device)
+    app.router.add_get("/events", handle_events)
+    app.router.add_get("/baselines", handle_baselines)
+    return app
+
+
+if __name__ == "__main__":
+    print(f"[api] Serving on {API_HOST}:{API_PORT} (pipeline TTL {PIPELINE_TTL}s)")
+    web.run_app(create_app(), host=API_HOST, port=API_PORT, print=None)
@@ -7,6 +7,7 @@ BASE_URL = "https://colmena.stguimel.com/api/monnet/mty_sureste_sima/timeseries"
 SENSORS_COUNT = 13
 SAMPLES_PER_HOUR = 15
 BACKEND_OFFSET_HOURS = 13  # workaround: backend stores CST-1h labeled as UTC
+REQUEST_TIMEOUT = 10  # seconds; a hung upstream must not block callers forever
 
 
 def fetch_latest(limit: int = SENSORS_COUNT * SAMPLES_PER_HOUR) -> pd.DataFrame:
@@ -14,7 +15,7 @@ def fetch_latest(limit: int = SENSORS_COUNT * SAMPLES_PER_HOUR) -> pd.DataFrame:
     Fetches the latest readings from the API and returns a long-format DataFrame.
     """
     try:
-        response = requests.get(BASE_URL, params={"limit": limit})
+        response = requests.get(BASE_URL, params={"limit": limit}, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         data = response.json()
         df = pd.DataFrame(data)
@@ -0,0 +1,291 @@
+import os
+import sys
+import json
+import time
+import gzip
+import asyncio
+import threading
+import types
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ["api", "agent", "processor", "ingestor"]:
+    sys.path.insert(0, os.path.join(ROOT, folder))
+
+import server
+
+
+class FakePipeline:
+    """Stub for run_pipeline that counts upstream calls and labels each run."""
+
+    def __init__(self, delay: float = 0, fail: bool = False):
+        self.calls = 0
+        self.delay = delay
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    def __call__(self) -> dict:
+        with self.lock:
+            self.calls += 1
+            run = self.calls
+        time.sleep(self.delay)
+        if self.fail:
+            raise KeyError("sensor_id")
+        return {
+            "status": "ok",
+            "timestamp": f"run{run}",
+            "samples_fetched": 1,
+            "unique_timestamps": 1,
+            "environmental": [{"sensor_id": "pm25", "mean": 10.0, "variance": float("nan")}],
+            "device_health": {"battery_soc": 90.0, "failure_code": 0}
+        }
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    server._cache.clear()
+    server._inflight.clear()
+    monkeypatch.setattr(server, "PIPELINE_TTL", 60)
+    monkeypatch.setattr(server, "ERROR_TTL", 60)
+    yield
+
+
+def use_pipeline(monkeypatch, pipeline: FakePipeline) -> FakePipeline:
+    monkeypatch.setattr(server, "run_pipeline", pipeline)
+    return pipeline
+
+
+def run_with_client(scenario):
+    async def main():
+        async with TestClient(TestServer(server.create_app())) as client:
+            return await scenario(client)
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_share_one_pipeline_run(monkeypatch):
+    pipeline = use_pipeline(monkeypatch, FakePipeline(delay=0.2))
+
+    async def scenario(client):
+        responses = await asyncio.gather(*[client.get("/report") for _ in range(50)])
+        responses.append(await client.get("/device"))
+        return [r.status for r in responses]
+
+    assert set(run_with_client(scenario)) == {200}
+    assert pipeline.calls == 1
+
+
+def test_if_none_match_returns_304(monkeypatch):
+    use_pipeline(monkeypatch, FakePipeline())
+
+    async def scenario(client):
+        first = await client.get("/report", headers={"Accept-Encoding": "identity"})
+        etag = first.headers["ETag"]
+        revalidated = await client.get("/report", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+        return first.status, revalidated.status, revalidated.headers["ETag"] == etag
+
+    assert run_with_client(scenario) == (200, 304, True)
+
+
+def test_gzip_negotiation_uses_distinct_etags(monkeypatch):
+    use_pipeline(monkeypatch, FakePipeline())
+
+    async def scenario(client):
+        results = {}
+        for accept in ["gzip", "gzip;q=0", "identity"]:
+            response = await client.get("/report", headers={"Accept-Encoding": accept}, auto_decompress=False)
+            results[accept] = (response.headers.get("Content-Encoding"), response.headers["ETag"], await response.read())
+        return results
+
+    results = run_with_client(scenario)
+    assert results["gzip"][0] == "gzip"
+    assert results["gzip;q=0"][0] is None
+    assert results["gzip"][1] != results["identity"][1]
+    assert gzip.decompress(results["gzip"][2]) == results["identity"][2]
+
+
+def test_nan_is_encoded_as_null(monkeypatch):
+    use_pipeline(monkeypatch, FakePipeline())
+
+    async def scenario(client):
+        response = await client.get("/report?modules=particle")
+        return await response.text()
+
+    body = json.loads(run_with_client(scenario), parse_constant=pytest.fail)
+    assert body["modules"]["particle"]["sensors"][0]["variance"] is None
+
+
+def test_payloads_expire_with_their_pipeline_run(monkeypatch):
+    use_pipeline(monkeypatch, FakePipeline())
+    monkeypatch.setattr(server, "PIPELINE_TTL", 0.3)
+
+    async def scenario(client):
+        await client.get("/report")
+        await asyncio.sleep(0.2)
+        await client.get("/device")
+        await asyncio.sleep(0.2)
+        report = await (await client.get("/report")).json()
+        device = await (await client.get("/device")).json()
+        return report["timestamp"], device["timestamp"]
+
+    assert run_with_client(scenario) == ("run2", "run2")
+
+
+def test_pipeline_failure_is_cached(monkeypatch):
+    pipeline = use_pipeline(monkeypatch, FakePipeline(fail=True))
+
+    async def scenario(client):
+        return [(await client.get("/device")).status for _ in range(5)]
+
+    assert run_with_client(scenario) == [503] * 5
+    assert pipeline.calls == 1
+
+
+def test_hung_pipeline_times_out_and_is_cached(monkeypatch):
+    pipeline = use_pipeline(monkeypatch, FakePipeline(delay=0.5))
+    monkeypatch.setattr(server, "COMPUTE_TIMEOUT", 0.1)
+
+    async def scenario(client):
+        return [(await client.get("/report")).status for _ in range(3)]
+
+    assert run_with_client(scenario) == [503] * 3
+    assert pipeline.calls == 1
+
+
+def test_unknown_baseline_sensor_is_rejected(monkeypatch):
+    async def scenario(client):
+        response = await client.get("/baselines?hour=8&day_of_week=Monday&sensors=pm25,random")
+        return response.status
+
+    assert run_with_client(scenario) == 400
+    assert not server._cache
+
+
+def test_stale_entry_served_while_refresh_runs(monkeypatch):
+    pipeline = use_pipeline(monkeypatch, FakePipeline(delay=0.3))
+    monkeypatch.setattr(server, "PIPELINE_TTL", 0.1)
+
+    async def scenario(client):
+        await client.get("/report")
+        await asyncio.sleep(0.2)
+        refresh = asyncio.ensure_future(client.get("/report"))
+        await asyncio.sleep(0.05)
+        stale = await (await client.get("/report")).json()
+        fresh = await (await refresh).json()
+        return stale["timestamp"], fresh["timestamp"]
+
+    assert run_with_client(scenario) == ("run1", "run2")
+    assert pipeline.calls == 2
+
+
+def test_expired_entries_are_evicted(monkeypatch):
+    use_pipeline(monkeypatch, FakePipeline())
+    monkeypatch.setattr(server, "PIPELINE_TTL", 0.1)
+    monkeypatch.setattr(server, "STALE_GRACE", 0)
+
+    async def scenario(client):
+        await client.get("/report?modules=particle")
+        await asyncio.sleep(0.2)
+        await client.get("/device")
+
+    run_with_client(scenario)
+    report_keys = [key[:2] for key in server._cache if key[0] == "report"]
+    assert report_keys == [("report", ("device",))]
+
+
+def test_stale_run_is_encoded_once_during_refresh(monkeypatch):
+    use_pipeline(monkeypatch, FakePipeline(delay=0.5))
+    monkeypatch.setattr(server, "PIPELINE_TTL", 0.1)
+    builds = []
+    build_sensor_report = server.build_sensor_report
+
+    def counting_build(data, modules=None):
+        builds.append(data["timestamp"])
+        return build_sensor_report(data, modules)
+
+    monkeypatch.setattr(server, "build_sensor_report", counting_build)
+
+    async def scenario(client):
+        await client.get("/device")
+        await asyncio.sleep(0.2)
+        refresh = asyncio.ensure_future(client.get("/report"))
+        await asyncio.sleep(0.05)
+        statuses = [(await client.get("/device")).status for _ in range(20)]
+        await refresh
+        return statuses
+
+    assert run_with_client(scenario) == [200] * 20
+    assert builds == ["run1", "run2"]
+
+
+def test_module_order_is_canonical_and_shares_one_payload(monkeypatch):
+    use_pipeline(monkeypatch, FakePipeline())
+
+    async def scenario(client):
+        default = await client.get("/report")
+        explicit = await client.get("/report?modules=device,chemical,particle,environmental")
+        body = await (await client.get("/report?modules=device,particle")).json()
+        return default.headers["ETag"], explicit.headers["ETag"], list(body["modules"])
+
+    default_etag, explicit_etag, modules = run_with_client(scenario)
+    assert default_etag == explicit_etag
+    assert modules == ["particle", "device"]
+    assert len([key for key in server._cache if key[0] == "report"]) == 2
+
+
+class FakeDatabase(types.ModuleType):
+    """Stub for db/database.py that counts queries."""
+
+    def __init__(self):
+        super().__init__("database")
+        self.calls = 0
+
+    def get_similar_events(self, hour: int, day_of_week: str) -> list:
+        self.calls += 1
+        return [{"trigger": "pm25_spike", "hour": hour, "day_of_week": day_of_week}]
+
+    def get_baseline(self, day_of_week: str, hour: int, sensor_id: str) -> dict:
+        self.calls += 1
+        return {"sensor_id": sensor_id, "mean": 12.5} if sensor_id == "pm25" else None
+
+
+@pytest.fixture
+def database(monkeypatch) -> FakeDatabase:
+    fake = FakeDatabase()
+    monkeypatch.setitem(sys.modules, "database", fake)
+    return fake
+
+
+def test_events_are_served_and_cached(database):
+    async def scenario(client):
+        responses = [await client.get("/events?hour=8&day_of_week=Monday") for _ in range(3)]
+        return [r.status for r in responses], await responses[0].json()
+
+    statuses, body = run_with_client(scenario)
+    assert statuses == [200] * 3
+    assert body["events_found"] == 1
+    assert body["similar_events"][0]["trigger"] == "pm25_spike"
+    assert (body["hour"], body["day_of_week"]) == (8, "Monday")
+    assert database.calls == 1
+
+
+def test_baselines_are_served_and_cached(database):
+    async def scenario(client):
+        responses = [await client.get("/baselines?hour=8&day_of_week=Monday") for _ in range(3)]
+        return [r.status for r in responses], await responses[0].json()
+
+    statuses, body = run_with_client(scenario)
+    assert statuses == [200] * 3
+    assert body["baselines"] == {"pm25": {"sensor_id": "pm25", "mean": 12.5}}
+    assert database.calls == 2  # pm10 and pm25, once
+
+
+@pytest.mark.parametrize("query", ["hour=24", "hour=-1", "hour=abc", "day_of_week=Someday"])
+@pytest.mark.parametrize("path", ["/events", "/baselines"])
+def test_invalid_hour_or_day_is_rejected(database, path, query):
+    async def scenario(client):
+        return (await client.get(f"{path}?{query}")).status
+
+    assert run_with_client(scenario) == 400
+    assert database.calls == 0